@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+# STT builds its OpenAI client at import time; no request is ever sent from these tests.
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from translator_app import batch  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    real_sleep = asyncio.sleep
+
+    async def sleep(seconds):
+        fake.now += seconds
+        await real_sleep(0)
+
+    monkeypatch.setattr(batch, "time", SimpleNamespace(monotonic=fake.monotonic))
+    monkeypatch.setattr(batch.asyncio, "sleep", sleep)
+    return fake
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    seen = []
+    failing = set()
+
+    def process_audio(wav, output_dir=None, voice=None, target_lang=None):
+        seen.append(wav.name)
+        if wav.name in failing:
+            raise RuntimeError("boom")
+        return {"target_language": target_lang, "translation": f"{wav.stem} translated"}
+
+    monkeypatch.setattr(batch, "process_audio", process_audio)
+    return SimpleNamespace(seen=seen, failing=failing)
+
+
+def make_wavs(directory, *names):
+    for name in names:
+        path = directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+
+
+def run(input_dir, manifest, output_dir=None, target="es", **kwargs):
+    return asyncio.run(batch.run_batch(input_dir, manifest, output_dir or input_dir / "tts", target, **kwargs))
+
+
+def read_manifest(manifest):
+    return [json.loads(line) for line in manifest.read_text().splitlines()]
+
+
+def test_failed_entry_is_retried_on_resume(tmp_path, calls):
+    make_wavs(tmp_path, "a.wav", "b.wav")
+    manifest = tmp_path / "results.jsonl"
+    calls.failing.add("b.wav")
+
+    summary = run(tmp_path, manifest)
+    assert summary["ok"] == 1 and summary["errors"] == 1
+
+    calls.failing.clear()
+    calls.seen.clear()
+    summary = run(tmp_path, manifest)
+    assert calls.seen == ["b.wav"]
+    assert summary["ok"] == 1
+    assert read_manifest(manifest)[-1]["status"] == "ok"
+
+
+def test_changed_target_or_voice_reprocesses(tmp_path, calls):
+    make_wavs(tmp_path, "a.wav")
+    manifest = tmp_path / "results.jsonl"
+    run(tmp_path, manifest)
+    run(tmp_path, manifest)
+    run(tmp_path, manifest, target="fr")
+    run(tmp_path, manifest, voice="alloy")
+    assert calls.seen == ["a.wav", "a.wav", "a.wav"]
+
+
+def test_truncated_last_line_is_repaired(tmp_path, calls):
+    make_wavs(tmp_path, "a.wav", "b.wav")
+    manifest = tmp_path / "results.jsonl"
+    done = {"wav": "a.wav", "target": "es", "voice": None, "status": "ok"}
+    manifest.write_text(json.dumps(done) + '\n{"wav": "b.wav", "sta')
+
+    run(tmp_path, manifest)
+    assert calls.seen == ["b.wav"]
+    lines = manifest.read_text().splitlines()
+    assert lines[1] == '{"wav": "b.wav", "sta'
+    assert json.loads(lines[2])["wav"] == "b.wav"
+    assert batch.load_completed(manifest, "es") == {"a.wav", "b.wav"}
+
+
+def test_load_completed_skips_unusable_lines(tmp_path):
+    manifest = tmp_path / "results.jsonl"
+    lines = [
+        json.dumps({"wav": "ok.wav", "target": "es", "voice": None, "status": "ok"}),
+        json.dumps({"wav": "failed.wav", "target": "es", "voice": None, "status": "error"}),
+        json.dumps({"wav": "french.wav", "target": "fr", "voice": None, "status": "ok"}),
+        json.dumps({"target": "es", "voice": None, "status": "ok"}),
+        json.dumps(["not", "an", "object"]),
+        '"just a string"',
+        '{"wav": "partial.wav", "stat',
+    ]
+    manifest.write_text("\n".join(lines))
+    assert batch.load_completed(manifest, "es") == {"ok.wav"}
+    assert batch.load_completed(tmp_path / "missing.jsonl", "es") == set()
+
+
+def test_output_dir_is_excluded(tmp_path, calls):
+    make_wavs(tmp_path, "s1/audio.wav", "tts/s1/audio_es.wav")
+    output_dir = tmp_path / "tts"
+    assert batch.find_wavs(tmp_path, exclude=output_dir) == [tmp_path / "s1" / "audio.wav"]
+
+    run(tmp_path, tmp_path / "results.jsonl", output_dir=output_dir)
+    assert calls.seen == ["audio.wav"]
+
+
+def test_token_bucket_spacing(clock):
+    bucket = batch.TokenBucket(rate=60, burst=2)
+    starts = []
+
+    async def take(count):
+        for _ in range(count):
+            await bucket.acquire()
+            starts.append(clock.now)
+
+    asyncio.run(take(5))
+    assert starts == pytest.approx([0, 0, 1, 2, 3])
+
+
+def test_rate_and_burst_limit_starts(tmp_path, clock, calls, monkeypatch):
+    make_wavs(tmp_path, *(f"{index}.wav" for index in range(4)))
+    starts = []
+
+    class RecordingBucket(batch.TokenBucket):
+        async def acquire(self):
+            await super().acquire()
+            # the worker threads read the fake clock late, so record when each start is released
+            starts.append(clock.now)
+
+    monkeypatch.setattr(batch, "TokenBucket", RecordingBucket)
+    run(tmp_path, tmp_path / "results.jsonl", concurrency=4, rate=30, burst=2)
+    assert starts == pytest.approx([0, 0, 2, 4])
+    assert sorted(calls.seen) == ["0.wav", "1.wav", "2.wav", "3.wav"]
+
+
+def test_sessions_results_default_outside_sessions(tmp_path, calls, monkeypatch):
+    sessions = tmp_path.resolve() / "sessions"
+    reprocessed = tmp_path.resolve() / "reprocessed"
+    monkeypatch.setattr(batch, "SESSIONS_DIR", sessions)
+    monkeypatch.setattr(batch, "REPROCESSED_DIR", reprocessed)
+    make_wavs(sessions, "s1/audio.wav")
+
+    batch.main([str(sessions), "--target", "es"])
+    assert (reprocessed / batch.MANIFEST_FILENAME).exists()
+    assert not (sessions / batch.MANIFEST_FILENAME).exists()
@@ -0,0 +1,124 @@
+from types import SimpleNamespace
+
+import pytest
+
+from translator_app import profiling
+
+
+@pytest.fixture(autouse=True)
+def reset_profiling(tmp_path):
+    saved = dict(profiling._config)
+    profiling.configure(sample_rate=0, sids=[], window=60, output_dir=tmp_path)
+    yield
+    profiling._stats.clear()
+    profiling._config.clear()
+    profiling._config.update(saved)
+    profiling.configure()
+
+
+def test_configure_clamps_values():
+    config = profiling.configure(sample_rate=3, window=0)
+    assert config["sample_rate"] == 1.0
+    assert config["window"] == 1.0
+    assert profiling.configure(sample_rate=-1)["sample_rate"] == 0.0
+
+
+def test_configure_enabled_follows_rate_and_sids():
+    assert not profiling.current_config()["enabled"]
+    assert profiling.configure(sids=[" abc ", ""])["sids"] == ["abc"]
+    assert profiling.current_config()["enabled"]
+    assert not profiling.configure(sids=[])["enabled"]
+
+
+@pytest.mark.parametrize("sids", ["abc123", [1, 2], ["ok", None]])
+def test_configure_rejects_bad_sids_without_changes(sids):
+    with pytest.raises(TypeError):
+        profiling.configure(sample_rate=0.5, sids=sids)
+    assert profiling.current_config()["sample_rate"] == 0.0
+    assert profiling.current_config()["sids"] == []
+
+
+@pytest.mark.parametrize("settings", [{"sample_rate": "NaN"}, {"window": float("inf")}, {"sample_rate": "abc"}])
+def test_configure_rejects_non_finite_numbers(settings):
+    with pytest.raises(ValueError):
+        profiling.configure(**settings)
+    assert profiling.current_config()["sample_rate"] == 0.0
+    assert profiling.current_config()["window"] == 60.0
+
+
+def test_configure_from_env_falls_back_to_disabled(monkeypatch):
+    monkeypatch.setenv("PROFILE_SAMPLE_RATE", "abc")
+    monkeypatch.setenv("PROFILE_SIDS", "abc123")
+    with pytest.warns(RuntimeWarning, match="PROFILE_"):
+        profiling._configure_from_env()
+    assert not profiling.current_config()["enabled"]
+
+
+def test_configure_from_env(monkeypatch):
+    monkeypatch.setenv("PROFILE_SAMPLE_RATE", "0.5")
+    monkeypatch.setenv("PROFILE_SIDS", "abc, def")
+    profiling._configure_from_env()
+    config = profiling.current_config()
+    assert config["sample_rate"] == 0.5
+    assert config["sids"] == ["abc", "def"]
+
+
+def test_should_profile_listed_sid_always(monkeypatch):
+    profiling.configure(sids=["abc"])
+    monkeypatch.setattr(profiling.random, "random", lambda: 0.99)
+    assert profiling._should_profile("abc")
+    assert not profiling._should_profile("other")
+    assert not profiling._should_profile(None)
+
+
+def test_should_profile_samples_by_rate(monkeypatch):
+    profiling.configure(sample_rate=0.25)
+    monkeypatch.setattr(profiling.random, "random", lambda: 0.1)
+    assert profiling._should_profile(None)
+    monkeypatch.setattr(profiling.random, "random", lambda: 0.3)
+    assert not profiling._should_profile(None)
+
+
+def test_request_disabled_is_not_sampled():
+    with profiling.request("abc") as sampled:
+        assert not sampled
+        assert not profiling.is_active()
+    assert profiling._stats == {}
+
+
+def test_collapsed_stacks_follows_most_expensive_caller():
+    main = ("app.py", 1, "main")
+    fast = ("app.py", 10, "fast")
+    slow = ("app.py", 20, "slow")
+    leaf = ("~", 0, "<built-in method len>")
+    stats = SimpleNamespace(
+        stats={
+            main: (1, 1, 0.0, 0.5, {}),
+            fast: (1, 1, 0.001, 0.1, {main: (1, 1, 0.001, 0.1)}),
+            slow: (1, 1, 0.002, 0.4, {main: (1, 1, 0.002, 0.4)}),
+            leaf: (2, 2, 0.003, 0.003, {fast: (1, 1, 0.001, 0.001), slow: (1, 1, 0.002, 0.002)}),
+        }
+    )
+    assert sorted(profiling.collapsed_stacks(stats)) == [
+        "main (app.py:1);fast (app.py:10) 1000",
+        "main (app.py:1);slow (app.py:20) 2000",
+        "main (app.py:1);slow (app.py:20);<built-in method len> 3000",
+    ]
+
+
+def test_collapsed_stacks_stops_on_recursion():
+    func = ("app.py", 5, "recurse")
+    stats = SimpleNamespace(stats={func: (3, 1, 0.001, 0.001, {func: (2, 2, 0.0, 0.0)})})
+    assert profiling.collapsed_stacks(stats) == ["recurse (app.py:5) 1000"]
+
+
+def test_flush_names_are_unique(tmp_path):
+    profiling.configure(sids=["abc"])
+    written = []
+    for _ in range(2):
+        with profiling.request("abc", "chunk"):
+            sum(range(100))
+        written.extend(profiling.flush())
+    assert len(written) == 4
+    assert len({path.name for path in written}) == 4
+    assert all(path.exists() for path in written)
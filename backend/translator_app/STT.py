@@ -6,6 +6,8 @@ from typing import Dict, List, Optional
 
 from openai import OpenAI
 
+from translator_app import profiling
+
 
 client = OpenAI()
 
@@ -157,25 +159,33 @@ def process_audio(
     wav_path: str,
     output_dir: Optional[str | Path] = None,
     voice: Optional[str] = None,
+    target_lang: Optional[str] = None,
 ) -> Dict[str, Optional[str]]:
     """
     End-to-end helper: transcribe, translate, and optionally synthesize speech.
+
+    Pass `target_lang` to skip the session language memory and always translate into it.
     """
     wav_path = str(wav_path)
-    transcript_payload = transcribe_with_detection(wav_path)
+    with profiling.section("transcribe"):
+        transcript_payload = transcribe_with_detection(wav_path)
     print(transcript_payload)
     source_lang = transcript_payload["language"]
     transcript_text = transcript_payload["text"]
 
-    target_lang = choose_target_language(source_lang)
-    translated_text = translate_text(transcript_text, source_lang, target_lang) if target_lang else ""
+    target_lang = target_lang or choose_target_language(source_lang)
+    translated_text = ""
+    if target_lang:
+        with profiling.section("translate"):
+            translated_text = translate_text(transcript_text, source_lang, target_lang)
 
     synthesized_path = None
     if voice and translated_text:
         out_dir = Path(output_dir) if output_dir else Path(wav_path).parent
         out_dir.mkdir(parents=True, exist_ok=True)
         speech_path = out_dir / f"{Path(wav_path).stem}_{target_lang}"
-        synthesized_path = str(synthesize_speech(translated_text, speech_path, voice=voice))
+        with profiling.section("synthesize"):
+            synthesized_path = str(synthesize_speech(translated_text, speech_path, voice=voice))
 
     return {
         "source_language": source_lang,
@@ -6,6 +6,7 @@ import struct
 import time
 import re
 import shutil
+from translator_app import profiling
 from translator_app.STT import process_audio, LANGUAGE_MEMORY
 
 app = Flask(__name__)
@@ -85,6 +86,12 @@ def _session_paths(sid: str):
 # audio-chunk route
 @app.route("/audio-chunk", methods=["POST"])
 def receive_audio_chunk():
+    # only sampled requests (or sids listed in profiling) are actually profiled
+    with profiling.request(request.args.get("sid"), "audio_chunk"):
+        return _receive_audio_chunk()
+
+
+def _receive_audio_chunk():
     sid = request.args.get("sid")
 
     #catches errors with the sid
@@ -180,14 +187,15 @@ def receive_audio_chunk():
     # handles the case when the last chunk has been sent
     if last_flag:
         meta["complete"] = True
-        # reads the raw pcm_bytes
-        with open(paths["raw"], "rb") as raw_in:
-            pcm_bytes = raw_in.read()
-        # creates the wav header combined with the pcm data
-        wav_bytes = wav_header(len(pcm_bytes), sample_rate, bits_per_sample, channels) + pcm_bytes
-        # writes the wav data into a file
-        with open(paths["wav"], "wb") as wav_out:
-            wav_out.write(wav_bytes)
+        with profiling.allocations("wav_assembly"):
+            # reads the raw pcm_bytes
+            with open(paths["raw"], "rb") as raw_in:
+                pcm_bytes = raw_in.read()
+            # creates the wav header combined with the pcm data
+            wav_bytes = wav_header(len(pcm_bytes), sample_rate, bits_per_sample, channels) + pcm_bytes
+            # writes the wav data into a file
+            with open(paths["wav"], "wb") as wav_out:
+                wav_out.write(wav_bytes)
         meta["wav_path"] = paths["wav"]
         response["wav_file"] = paths["wav"]
         response["total_bytes"] = len(wav_bytes)
@@ -222,5 +230,29 @@ def get_audio_wav():
         abort(404)
     return send_file(paths["wav"], mimetype="audio/wav", as_attachment=True, download_name=f"{sid}.wav")
 
+
+# profiling route, GET shows the current settings and POST updates them
+@app.route("/profiling", methods=["GET", "POST"])
+def profiling_config():
+    if request.method == "GET":
+        return jsonify(profiling.current_config()), 200
+
+    body = request.get_json(silent=True)
+    if body is None:
+        body = {}
+    if not isinstance(body, dict):
+        return jsonify({"error": "invalid profiling settings"}), 400
+    try:
+        config = profiling.configure(
+            sample_rate=body.get("sample_rate"),
+            sids=body.get("sids"),
+            window=body.get("window"),
+        )
+    except (TypeError, ValueError):
+        return jsonify({"error": "invalid profiling settings"}), 400
+    if body.get("flush"):
+        config["written"] = [str(path) for path in profiling.flush()]
+    return jsonify(config), 200
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000, debug=True)
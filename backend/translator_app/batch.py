@@ -0,0 +1,225 @@
+"""
+Reprocess a directory of recorded utterances without going through the Flask app.
+
+Example:
+    python -m translator_app.batch translator_app/sessions --target es --concurrency 4 --rate 60
+
+Batch runs always translate into `--target`. The session language memory in STT
+is shared and depends on the order utterances arrive in, so it is never used here.
+
+A run resumes from its manifest, but only results produced with the same
+`--target` and `--voice` count as done, so changing either reprocesses everything.
+The Flask app wipes `sessions/` on start, so results for that tree default to
+`reprocessed/` next to it instead of into the input directory.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from translator_app.STT import process_audio
+
+
+MANIFEST_FILENAME = "results.jsonl"
+TTS_DIRNAME = "tts"
+BASE_DIR = Path(__file__).resolve().parent
+# matches SESS_DIR in app.py, which cleanup_sessions() empties on every start
+SESSIONS_DIR = BASE_DIR / "sessions"
+REPROCESSED_DIR = BASE_DIR / "reprocessed"
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per minute with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate / 60.0
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def find_wavs(input_dir: Path, exclude: Optional[Path] = None) -> List[Path]:
+    """Collect every WAV under `input_dir`, skipping anything inside `exclude`."""
+    wavs = []
+    for path in sorted(input_dir.rglob("*.wav")):
+        if exclude and exclude in path.parents:
+            continue
+        wavs.append(path)
+    return wavs
+
+
+def load_completed(manifest_path: Path, target_lang: str, voice: Optional[str] = None) -> Set[str]:
+    """Return the utterances the manifest already has a successful result for with these settings."""
+    done = set()
+    if not manifest_path.exists():
+        return done
+    with open(manifest_path, "r", encoding="utf-8") as manifest_in:
+        for line in manifest_in:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # a partial line is left behind if a run was killed mid-write
+                continue
+            if not isinstance(entry, dict) or "wav" not in entry:
+                continue
+            if entry.get("status") == "ok" and entry.get("target") == target_lang and entry.get("voice") == voice:
+                done.add(entry["wav"])
+    return done
+
+
+def _terminate_last_line(manifest_path: Path) -> None:
+    """End a partial last line so the next appended entry starts on its own line."""
+    if not manifest_path.exists() or manifest_path.stat().st_size == 0:
+        return
+    with open(manifest_path, "rb+") as manifest:
+        manifest.seek(-1, 2)
+        if manifest.read(1) != b"\n":
+            manifest.write(b"\n")
+
+
+async def run_batch(
+    input_dir: Path,
+    manifest_path: Path,
+    output_dir: Path,
+    target_lang: str,
+    voice: Optional[str] = None,
+    concurrency: int = 4,
+    rate: float = 0,
+    burst: int = 1,
+) -> Dict[str, float]:
+    """Run the pipeline over every pending WAV and append the results to the manifest."""
+    if not target_lang:
+        raise ValueError("target_lang is required for batch runs")
+    wavs = find_wavs(input_dir, exclude=output_dir)
+    completed = load_completed(manifest_path, target_lang, voice)
+    pending = [wav for wav in wavs if wav.relative_to(input_dir).as_posix() not in completed]
+    print(f"{len(wavs)} utterances found, {len(wavs) - len(pending)} already done, {len(pending)} to process")
+
+    concurrency = max(concurrency, 1)
+    semaphore = asyncio.Semaphore(concurrency)
+    # the loop's default executor is capped at min(32, cpus + 4) threads
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+    loop = asyncio.get_running_loop()
+    bucket = TokenBucket(rate, burst) if rate > 0 else None
+    counts = {"ok": 0, "error": 0}
+    started = time.monotonic()
+
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    _terminate_last_line(manifest_path)
+    with executor, open(manifest_path, "a", encoding="utf-8") as manifest_out:
+
+        async def handle(wav: Path) -> None:
+            rel = wav.relative_to(input_dir)
+            async with semaphore:
+                if bucket:
+                    await bucket.acquire()
+                began = time.monotonic()
+                entry = {"wav": rel.as_posix(), "target": target_lang, "voice": voice}
+                try:
+                    # mirror the input layout so every sessions/<sid>/audio.wav gets its own output
+                    result = await loop.run_in_executor(
+                        executor,
+                        partial(
+                            process_audio,
+                            wav,
+                            output_dir=output_dir / rel.parent,
+                            voice=voice,
+                            target_lang=target_lang,
+                        ),
+                    )
+                    entry.update(status="ok", **result)
+                except Exception as exc:
+                    entry.update(status="error", error=str(exc))
+                entry["elapsed"] = round(time.monotonic() - began, 3)
+
+            counts[entry["status"]] += 1
+            manifest_out.write(json.dumps(entry) + "\n")
+            manifest_out.flush()
+            finished = counts["ok"] + counts["error"]
+            minutes = max(time.monotonic() - started, 1e-6) / 60
+            print(f"[{finished}/{len(pending)}] {entry['status']} {rel} ({finished / minutes:.1f} utt/min)")
+
+        await asyncio.gather(*(handle(wav) for wav in pending))
+
+    minutes = (time.monotonic() - started) / 60
+    total = counts["ok"] + counts["error"]
+    return {
+        "processed": total,
+        "ok": counts["ok"],
+        "errors": counts["error"],
+        "minutes": round(minutes, 2),
+        "utterances_per_minute": round(total / minutes, 2) if minutes else 0.0,
+    }
+
+
+def _within(path: Path, directory: Path) -> bool:
+    return path == directory or directory in path.parents
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Transcribe, translate and optionally speak a directory of WAVs.")
+    parser.add_argument("input_dir", type=Path, help="directory (e.g. sessions/) searched recursively for WAVs")
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        help=f"results JSONL used to resume (default: <input_dir>/{MANIFEST_FILENAME}, or under reprocessed/ for sessions/)",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        help=f"where synthesized speech goes (default: <input_dir>/{TTS_DIRNAME}, or under reprocessed/ for sessions/)",
+    )
+    parser.add_argument("--voice", help="TTS voice; speech is only synthesized when set")
+    parser.add_argument("--target", required=True, help="language every utterance is translated into (e.g. es)")
+    parser.add_argument("--concurrency", type=int, default=4, help="max utterances in flight")
+    parser.add_argument("--rate", type=float, default=0, help="max utterances started per minute (0 = unlimited)")
+    parser.add_argument("--burst", type=int, default=1, help="utterances allowed to start back to back")
+    args = parser.parse_args(argv)
+
+    input_dir = args.input_dir.resolve()
+    if not input_dir.is_dir():
+        parser.error(f"{input_dir} is not a directory")
+    results_dir = input_dir
+    if _within(input_dir, SESSIONS_DIR):
+        results_dir = REPROCESSED_DIR / input_dir.relative_to(SESSIONS_DIR)
+    manifest_path = (args.manifest or results_dir / MANIFEST_FILENAME).resolve()
+    output_dir = (args.output_dir or results_dir / TTS_DIRNAME).resolve()
+    for path in (manifest_path, output_dir):
+        if _within(path, SESSIONS_DIR):
+            print(f"warning: {path} is inside {SESSIONS_DIR}, which the Flask app clears on every start")
+
+    summary = asyncio.run(
+        run_batch(
+            input_dir,
+            manifest_path,
+            output_dir,
+            args.target,
+            voice=args.voice,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            burst=args.burst,
+        )
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
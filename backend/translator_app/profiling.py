@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+import atexit
+import cProfile
+import itertools
+import math
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import warnings
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+
+# Profiling is off unless a sample rate or a sid is configured, either through
+# these environment variables or at runtime via `configure`.
+#   PROFILE_SAMPLE_RATE  fraction of requests to profile (0.0 - 1.0)
+#   PROFILE_SIDS         comma separated sids that are always profiled
+#   PROFILE_WINDOW       seconds of profiles to aggregate before exporting
+#   PROFILE_DIR          where the exported files are written
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+_state = threading.local()
+_lock = threading.Lock()
+_stats: Dict[str, pstats.Stats] = {}
+_window_started = time.time()
+
+_config = {
+    "sample_rate": 0.0,
+    "sids": set(),
+    "window": 60.0,
+    "output_dir": os.path.join(BASE_DIR, "profiles"),
+}
+# Cached so the disabled path is a single boolean check.
+_enabled = False
+# tracemalloc is process wide, so concurrent `allocations` blocks share one trace.
+_tracing_users = 0
+_tracing_owned = False
+_TRACE_FRAMES = 5
+# Keeps exported file names unique when several exports land in the same millisecond.
+_export_ids = itertools.count()
+
+
+def configure(
+    sample_rate: Optional[float] = None,
+    sids: Optional[Set[str] | List[str]] = None,
+    window: Optional[float] = None,
+    output_dir: Optional[str | Path] = None,
+) -> Dict[str, object]:
+    """
+    Update the profiling settings and return the resulting configuration.
+
+    Raises TypeError or ValueError for bad values, in which case nothing changes.
+    """
+    global _enabled
+    updates: Dict[str, object] = {}
+    if sample_rate is not None:
+        updates["sample_rate"] = min(max(_finite(sample_rate, "sample_rate"), 0.0), 1.0)
+    if sids is not None:
+        # a bare string would otherwise be split into single character sids
+        if isinstance(sids, str) or not all(isinstance(sid, str) for sid in sids):
+            raise TypeError("sids must be a list of strings")
+        updates["sids"] = {sid.strip() for sid in sids if sid.strip()}
+    if window is not None:
+        updates["window"] = max(_finite(window, "window"), 1.0)
+    if output_dir is not None:
+        updates["output_dir"] = str(output_dir)
+    with _lock:
+        _config.update(updates)
+        _enabled = _config["sample_rate"] > 0 or bool(_config["sids"])
+    return current_config()
+
+
+def _finite(value: object, name: str) -> float:
+    number = float(value)  # type: ignore[arg-type]
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be a finite number")
+    return number
+
+
+def current_config() -> Dict[str, object]:
+    """Return a JSON friendly copy of the profiling settings."""
+    return {
+        "enabled": _enabled,
+        "sample_rate": _config["sample_rate"],
+        "sids": sorted(_config["sids"]),
+        "window": _config["window"],
+        "output_dir": _config["output_dir"],
+    }
+
+
+def _should_profile(sid: Optional[str]) -> bool:
+    if sid and sid in _config["sids"]:
+        return True
+    rate = _config["sample_rate"]
+    return rate > 0 and random.random() < rate
+
+
+def is_active() -> bool:
+    """True while the current thread is handling a sampled request."""
+    return getattr(_state, "active", False)
+
+
+@contextmanager
+def request(sid: Optional[str], name: str = "request") -> Iterator[bool]:
+    """
+    Decide whether this request is sampled and, if so, profile it under `name`.
+
+    Every `section` and `allocations` block entered on this thread while the
+    request is open is only recorded when the request was sampled.
+    """
+    if not _enabled or is_active() or not _should_profile(sid):
+        yield False
+        return
+    _state.active = True
+    try:
+        with section(name):
+            yield True
+    finally:
+        _state.active = False
+        _maybe_flush()
+
+
+@contextmanager
+def section(name: str) -> Iterator[None]:
+    """
+    Profile a block with cProfile when the current request is sampled.
+
+    Nested sections pause the enclosing profiler, so each name only accounts
+    for the time spent outside of its child sections.
+    """
+    if not is_active():
+        yield
+        return
+    stack = getattr(_state, "profilers", None)
+    if stack is None:
+        stack = _state.profilers = []
+    profiler = _start_profiler(name, stack)
+    try:
+        yield
+    finally:
+        _stop_profiler(name, stack, profiler)
+
+
+@contextmanager
+def allocations(name: str) -> Iterator[None]:
+    """Write a tracemalloc snapshot of the block when the request is sampled."""
+    if not is_active():
+        yield
+        return
+    # keep the tracemalloc bookkeeping out of the enclosing section's profile
+    stack = _pause_enclosing()
+    try:
+        _start_tracing()
+    except Exception as exc:
+        _warn(f"starting tracemalloc for {name}", exc)
+        _resume_parent(stack)
+        yield
+        return
+    _resume_parent(stack)
+    try:
+        yield
+    finally:
+        _pause_enclosing()
+        try:
+            snapshot = tracemalloc.take_snapshot()
+            _write_snapshot(name, snapshot)
+        except Exception as exc:
+            _warn(f"writing the {name} allocation snapshot", exc)
+        finally:
+            _stop_tracing()
+            _resume_parent(stack)
+
+
+def _warn(action: str, exc: Exception) -> None:
+    # Profiling must never fail the request it is observing, so problems are only reported.
+    warnings.warn(f"profiling: {action} failed: {exc!r}", RuntimeWarning, stacklevel=3)
+
+
+def _start_profiler(name: str, stack: List[cProfile.Profile]) -> Optional[cProfile.Profile]:
+    """Pause the enclosing section and start a profiler for `name`, or return None."""
+    try:
+        if stack:
+            stack[-1].disable()
+        profiler = cProfile.Profile()
+        profiler.enable()
+    except Exception as exc:
+        _warn(f"starting the {name} profiler", exc)
+        _resume_parent(stack)
+        return None
+    stack.append(profiler)
+    return profiler
+
+
+def _stop_profiler(name: str, stack: List[cProfile.Profile], profiler: Optional[cProfile.Profile]) -> None:
+    if profiler is not None:
+        stack.pop()
+        try:
+            profiler.disable()
+            _record(name, profiler)
+        except Exception as exc:
+            _warn(f"recording the {name} profile", exc)
+    _resume_parent(stack)
+
+
+def _pause_enclosing() -> List[cProfile.Profile]:
+    """Disable the innermost running section and return the stack to resume it with."""
+    stack = getattr(_state, "profilers", None) or []
+    if stack:
+        try:
+            stack[-1].disable()
+        except Exception as exc:
+            _warn("pausing the enclosing profiler", exc)
+    return stack
+
+
+def _resume_parent(stack: List[cProfile.Profile]) -> None:
+    if not stack:
+        return
+    try:
+        stack[-1].enable()
+    except Exception as exc:
+        _warn("resuming the enclosing profiler", exc)
+
+
+def _start_tracing() -> None:
+    global _tracing_users, _tracing_owned
+    with _lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            # a short traceback keeps the per-allocation overhead of tracing down
+            tracemalloc.start(_TRACE_FRAMES)
+            _tracing_owned = True
+        _tracing_users += 1
+
+
+def _stop_tracing() -> None:
+    """Stop tracing once the last block leaves, unless someone else started it."""
+    global _tracing_users, _tracing_owned
+    with _lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+
+def _record(name: str, profiler: cProfile.Profile) -> None:
+    with _lock:
+        existing = _stats.get(name)
+        if existing is None:
+            _stats[name] = pstats.Stats(profiler)
+        else:
+            existing.add(profiler)
+
+
+def _output_dir() -> Path:
+    out_dir = Path(_config["output_dir"])
+    out_dir.mkdir(parents=True, exist_ok=True)
+    return out_dir
+
+
+def _write_snapshot(name: str, snapshot: tracemalloc.Snapshot) -> None:
+    base = _output_dir() / f"{name}-{_stamp()}"
+    snapshot.dump(str(base.with_suffix(".tracemalloc")))
+    top = snapshot.statistics("lineno")[:25]
+    with open(base.with_suffix(".alloc.txt"), "w", encoding="utf-8") as out:
+        for stat in top:
+            out.write(f"{stat}\n")
+
+
+def _stamp() -> str:
+    now = time.time()
+    millis = int(now * 1000) % 1000
+    return f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{millis:03d}-{next(_export_ids)}"
+
+
+def _maybe_flush() -> None:
+    if time.time() - _window_started >= _config["window"]:
+        flush()
+
+
+def flush() -> List[Path]:
+    """Export the aggregated profiles of the current window and start a new one."""
+    global _window_started
+    with _lock:
+        pending = dict(_stats)
+        _stats.clear()
+        _window_started = time.time()
+    if not pending:
+        return []
+
+    stamp = _stamp()
+    written = []
+    for name, stats in pending.items():
+        try:
+            out_dir = _output_dir()
+            pstats_path = out_dir / f"{name}-{stamp}.pstats"
+            stats.dump_stats(str(pstats_path))
+            folded_path = out_dir / f"{name}-{stamp}.folded"
+            with open(folded_path, "w", encoding="utf-8") as out:
+                for line in collapsed_stacks(stats):
+                    out.write(f"{line}\n")
+        except Exception as exc:
+            _warn(f"exporting the {name} profile", exc)
+            continue
+        written.extend([pstats_path, folded_path])
+    return written
+
+
+def _frame_label(func) -> str:
+    filename, lineno, funcname = func
+    if filename == "~":
+        return funcname
+    return f"{funcname} ({os.path.basename(filename)}:{lineno})"
+
+
+def collapsed_stacks(stats: pstats.Stats) -> List[str]:
+    """
+    Convert cProfile stats into collapsed-stack lines for flamegraph tools.
+
+    cProfile only records caller/callee pairs, so each function's self time is
+    attached to the stack reached by following its most expensive caller.
+    Values are in microseconds.
+    """
+    raw = stats.stats  # type: ignore[attr-defined]
+    lines = []
+    for func, (_, _, self_time, _, callers) in raw.items():
+        weight = int(self_time * 1_000_000)
+        if weight <= 0:
+            continue
+        frames = [_frame_label(func)]
+        seen = {func}
+        current = callers
+        while current:
+            parent = max(current, key=lambda caller: current[caller][3])
+            if parent in seen or parent not in raw:
+                break
+            seen.add(parent)
+            frames.append(_frame_label(parent))
+            current = raw[parent][4]
+        frames.reverse()
+        lines.append(f"{';'.join(frames)} {weight}")
+    return lines
+
+
+
+def _configure_from_env() -> None:
+    """Apply the PROFILE_* variables, leaving profiling disabled if any is invalid."""
+    try:
+        configure(
+            sample_rate=os.environ.get("PROFILE_SAMPLE_RATE") or None,
+            sids=os.environ.get("PROFILE_SIDS", "").split(","),
+            window=os.environ.get("PROFILE_WINDOW") or None,
+            output_dir=os.environ.get("PROFILE_DIR") or None,
+        )
+    except (TypeError, ValueError) as exc:
+        _warn("reading the PROFILE_* settings", exc)
+
+
+_configure_from_env()
+atexit.register(flush)